@@ -18,12 +18,14 @@ WhisperX 音頻轉精準對齊字幕工具 (Google Colab 版)
 
 依賴環境
 --------
-- Python 3.8+
+- Python 3.9+
 - FFmpeg
 - whisperx
 - torch
 - soundfile
 - numpy
+- orjson (可選，加速 JSON 讀寫)
+- numba (可選，字幕條數極多時加速時間格式化)
 - ipywidgets (Colab 交互)
 - google.colab (特定環境)
 
@@ -37,18 +39,36 @@ WhisperX 音頻轉精準對齊字幕工具 (Google Colab 版)
 
 函數簡介
 --------
+- `load_json(path)` / `dump_json(obj, path)`: 讀寫 JSON 文件，已安裝 orjson 時使用其 C 實現。
 - `load_saved_prompts()`: 從本地 JSON 文件載入已保存的提示詞列表。
 - `save_prompt(prompt)`: 將新的提示詞添加到保存列表並持久化。
-- `extract_voice_segments(audio_path, output_json, min_volume, min_duration)`:
-  使用 FFmpeg 分析音頻，提取人聲時間段（毫秒級），結果保存為 JSON。
+- `load_audio_cached(audio_path)`: 將音頻解碼為 16kHz float32 原始數據緩存於 /dev/shm，以內存映射方式返回。
+- `extract_voice_segments(audio_path, output_json, min_volume, min_duration, vad_method, audio)`:
+  使用 WhisperX 內建 VAD（GPU）或 FFmpeg 靜音檢測提取人聲時間段（毫秒級），結果保存為 JSON。
 - `format_time_srt(seconds)`: 將秒數轉換為 SRT 字幕的時間格式 (HH:MM:SS,mmm)。
 - `format_time_vtt(seconds)`: 將秒數轉換為 VTT 字幕的時間格式 (HH:MM:SS.mmm)。
-- `save_subtitle_formats(all_subtitles, base_filename, lang_suffix)`:
-  根據對齊結果生成 SRT、VTT、TSV、TXT 四種格式的字幕文件，返回文件路徑列表。
-- `transcribe_with_whisperx(audio_path, voice_segments, base_filename, lang, initial_prompt, model_size)`:
-  對每個預先提取的人聲片段進行 WhisperX 識別與對齊，返回所有字幕片段的詳細資料。
+- `format_times_bulk(seconds, sep)`: 使用 NumPy（已安裝 numba 且條數極多時使用編譯後的內核）批量將秒數陣列轉換為 SRT/VTT 時間格式。
+- `merge_short_segments(voice_segments, max_duration)`:
+  將相鄰的短人聲片段合併為不超過 30 秒的窗口，減少批量識別中的補齊浪費。
+- `split_long_segments(voice_segments, max_duration)`:
+  將超過 Whisper 輸入窗口（30 秒）的人聲片段切分為子片段，供批量識別使用。
+- `iter_subtitle_formats(subtitles, base_filename, lang_suffix)`:
+  根據列式對齊結果逐行生成 SRT、VTT、TSV、TXT 四種格式的字幕內容，返回 {文件名: 行生成器}。
+- `save_subtitle_formats(subtitles, base_filename, lang_suffix)`:
+  將上述四種格式的字幕寫入文件，返回文件路徑列表。
+- `zip_add_file(zipf, file_path, arcname)`: 將文件加入壓縮包，小於 4 KB 的文件直接存儲不壓縮。
+- `select_compute_settings(device)`: 按 GPU 計算能力選擇 faster-whisper 的量化類型與批量大小。
+- `load_vad_model_cached(vad_method, device)`: 緩存 WhisperX 內建 VAD 模型（pyannote/silero），人聲檢測與 Whisper 管線共用。
+- `load_whisper_model_cached(model_size, device, compute_type, lang, initial_prompt)`:
+  緩存 Whisper 推理管線，相同設定重複運行時跳過加載，僅更新初始提示詞。
+- `to_half_precision(model_a)`: 將 wav2vec2 對齊模型轉為 FP16，並自動轉換輸入/輸出精度。
+- `load_align_model_cached(lang, device)`: 按語言緩存 WhisperX 對齊模型（GPU 上為 FP16），重複運行時跳過加載。
+- `align_chunk(chunk, audio, text, model_a, metadata, device)`: 對單個片段進行逐字對齊，以列式結構返回各字符的絕對時間與文本。
+- `segment_chunk(chunk, text)`: 不做對齊，將整個片段作為一條字幕，返回與 `align_chunk` 相同的列式結構。
+- `transcribe_with_whisperx(audio_path, voice_segments, base_filename, lang, initial_prompt, model_size, audio, char_align)`:
+  將所有人聲片段一次性批量送入 WhisperX 識別，再逐段對齊（可關閉），以列式結構返回所有字幕的時間與文本。
 - `main_interface()`: 構建 Colab 交互式界面，處理用戶輸入並協調整個處理流程。
-- `install_dependencies()`: 安裝 FFmpeg 及必要的 Python 套件。
+- `install_dependencies()`: 安裝缺少的 FFmpeg 及必要 Python 套件（已存在則跳過）。
 
 版本歷史
 --------
@@ -57,25 +77,119 @@ WhisperX 音頻轉精準對齊字幕工具 (Google Colab 版)
 """
 
 import os
+import re
+import gc
+import io
+import hashlib
+import importlib.util
 import json
+import logging
 import subprocess
+import tempfile
+import threading
 import whisperx
 import torch
 import shutil
 import zipfile
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
 from pathlib import Path
 from google.colab import drive, files
 import ipywidgets as widgets
 from IPython.display import display, clear_output, HTML
 
+# orjson 可選：C 實現的 JSON 序列化，未安裝時退回標準庫 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# numba 可選：將批量時間格式化編譯爲機器碼，未安裝時使用 NumPy + f-string
+try:
+    import numba
+except ImportError:
+    numba = None
+
 # ===================== 初始化配置 =====================
+logger = logging.getLogger(__name__)
+
+# WhisperX load_audio 輸出的採樣率
+SAMPLE_RATE = 16000
+# 每毫秒的採樣點數，人聲片段（毫秒級整數）可直接換算爲採樣下標
+SAMPLES_PER_MS = SAMPLE_RATE // 1000
+# Whisper 單次輸入的最大窗口（秒），批量推理時每個片段不可超過
+MAX_CHUNK_SEC = 30
+# WhisperX 內建 VAD 的參數（與 whisperx.load_model 的默認值一致）
+VAD_OPTIONS = {"chunk_size": MAX_CHUNK_SEC, "vad_onset": 0.500, "vad_offset": 0.363}
+# 解碼後音頻（16kHz 單聲道 float32 原始數據）的緩存目錄，優先使用內存文件系統
+AUDIO_CACHE_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+# FFmpeg silencedetect 輸出解析（silence_start / silence_end 時間，秒），直接匹配原始字節
+# 數值部分只匹配合法的小數，匹配成功即可直接 float()，無需 try/except
+_SILENCE_RE = re.compile(rb"silence_(start|end):\s*(-?\d+(?:\.\d+)?)")
+# FFmpeg 輸入信息中的音頻總時長 (HH:MM:SS.xx)
+_DURATION_RE = re.compile(rb"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+
+# 並行對齊的線程數（限制上限以控制顯存佔用）
+ALIGN_WORKERS = min(4, os.cpu_count() or 1)
+
+# TXT 輸出中相鄰字符停頓超過此秒數時換行分段
+LINE_BREAK_THRESHOLD = 1.0
+
+# 書寫時詞間不加空格的語言（TXT 中整句字幕直接相連）
+NO_SPACE_LANGS = ("zh", "ja", "yue", "th", "lo", "my", "km")
+
+# 字幕條數達到此數量時才使用 numba 編譯的時間格式化：首次調用需 JIT 編譯
+# 或讀取磁盤緩存（數百毫秒以上），只有極長的字幕列表才能攤銷這部分開銷
+NUMBA_MIN_ITEMS = 200000
+
+# 對齊時每處理多少個片段釋放一次 CUDA 緩存
+EMPTY_CACHE_EVERY = 8
+
+# 小於此大小（字節）的文件打包時直接存儲，不做壓縮
+ZIP_STORE_MAX_BYTES = 4096
+
+# 字幕逐行寫出時的緩衝區大小（字節），合併成大塊後再寫文件/壓縮
+WRITE_BUFFER_SIZE = 1 << 20
+
+# 模型緩存，避免重複運行時重新加載：
+#   ("asr", model_size, lang, device, compute_type) -> Whisper 推理管線
+#   ("align", lang, device) -> (model_a, metadata)
+#   ("vad", vad_method, device) -> WhisperX VAD 模型
+# ASR/對齊模型每類只保留最近使用的一個，切換時釋放舊模型的顯存；
+# VAD 模型很小且 Whisper 管線會持有 pyannote 實例，按方法各保留一個
+_MODEL_CACHE = {}
+# 界面在後台線程預加載 Whisper 模型時，人聲檢測可能同時請求同一個 VAD 模型
+_VAD_LOCK = threading.Lock()
+
+def load_json(path):
+    """讀取JSON文件（優先使用orjson）"""
+    if orjson is not None:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    with open(path, "r", encoding="utf-8") as f:
+        return json.loads(f.read())
+
+def dump_json(obj, path):
+    """寫入縮進2格的UTF-8 JSON文件（優先使用orjson）"""
+    if orjson is not None:
+        # OPT_NON_STR_KEYS：與標準庫一致，允許整數等非字符串鍵
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        with open(path, "wb") as f:
+            f.write(data)
+        return
+    # 先完整序列化再一次性寫入，避免 json.dump 逐個片段寫文件
+    data = json.dumps(obj, ensure_ascii=False, indent=2)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data)
+
 # 加載已保存的prompt（如果存在）
 PROMPT_SAVE_PATH = "saved_prompts.json"
 def load_saved_prompts():
     """加載保存的提示詞列表"""
     if os.path.exists(PROMPT_SAVE_PATH):
-        with open(PROMPT_SAVE_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return load_json(PROMPT_SAVE_PATH)
     return ["請說普通話", "Speak clearly", "はっきり話してください"]
 
 def save_prompt(prompt):
@@ -83,86 +197,190 @@ def save_prompt(prompt):
     prompts = load_saved_prompts()
     if prompt not in prompts:
         prompts.append(prompt)
-        with open(PROMPT_SAVE_PATH, "w", encoding="utf-8") as f:
-            json.dump(prompts, f, ensure_ascii=False, indent=2)
+        dump_json(prompts, PROMPT_SAVE_PATH)
     return prompts
 
 # ===================== 核心功能函數 =====================
-def extract_voice_segments(audio_path, output_json="voice_segments.json", min_volume=-30, min_duration=0.5):
-    """使用FFmpeg提取音頻中的人聲時間段（毫秒級）"""
+def load_audio_cached(audio_path):
+    """解碼音頻爲 16kHz 單聲道 float32，緩存爲原始數據文件並以內存映射方式返回
+
+    緩存以文件路徑和修改時間爲鍵，同一文件重複處理時不再重新解碼；只保留最近一個文件的緩存。
+    """
+    stat = os.stat(audio_path)
+    key = hashlib.sha1(f"{os.path.abspath(audio_path)}:{stat.st_mtime_ns}".encode("utf-8")).hexdigest()[:16]
+    cache_path = os.path.join(AUDIO_CACHE_DIR, f"whisperx_audio_{key}.f32.raw")
+
+    if not os.path.exists(cache_path):
+        # 清理其他文件的緩存，避免佔滿內存文件系統
+        for old_path in Path(AUDIO_CACHE_DIR).glob("whisperx_audio_*.f32.raw"):
+            old_path.unlink(missing_ok=True)
+
+        # 先解碼到臨時文件再重命名，中途失敗不會留下不完整的緩存
+        tmp_path = f"{cache_path}.part"
+        cmd = [
+            "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+            "-threads", "0",
+            "-i", audio_path,
+            "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE),
+            "-y", tmp_path
+        ]
+        try:
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except subprocess.CalledProcessError as e:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise RuntimeError(f"音頻解碼失敗: {e.stderr.decode(errors='replace')}") from e
+        os.replace(tmp_path, cache_path)
+
+    if os.path.getsize(cache_path) == 0:
+        return np.zeros(0, dtype=np.float32)
+    # 寫時複製映射：按需從頁緩存讀取，下游（如 torch.from_numpy）仍可得到可寫陣列
+    return np.memmap(cache_path, dtype=np.float32, mode="c")
+
+def extract_voice_segments(audio_path, output_json="voice_segments.json", min_volume=-30, min_duration=0.5, vad_method="auto", audio=None):
+    """提取音頻中的人聲時間段（毫秒級）
+
+    vad_method 可選 "ffmpeg"（silencedetect 靜音檢測）、"pyannote" 或 "silero"（WhisperX 內建 VAD）；
+    "auto" 在有 GPU 時使用 pyannote，否則使用 FFmpeg。
+    audio 爲已解碼的 16kHz 波形（可選），傳入時 WhisperX VAD 不再重新解碼。
+    """
     if not os.path.exists(audio_path):
         raise FileNotFoundError(f"音頻文件不存在: {audio_path}")
 
+    if vad_method == "auto":
+        vad_method = "pyannote" if torch.cuda.is_available() else "ffmpeg"
+
+    if vad_method == "ffmpeg":
+        # 已有解碼緩存時直接分析緩存的原始數據，跳過重新解碼源文件
+        raw_path = getattr(audio, "filename", None)
+        voice_segments = _silencedetect_segments(audio_path, min_volume, min_duration, raw_path)
+    else:
+        voice_segments = _vad_segments(audio_path, min_duration, vad_method, audio)
+
+    # 保存人聲片段到JSON
+    dump_json(voice_segments, output_json)
+
+    print(f"✅ 提取到 {len(voice_segments)} 個人聲片段，已保存到 {output_json}")
+    return voice_segments
+
+def _vad_segments(audio_path, min_duration, vad_method="pyannote", audio=None):
+    """使用WhisperX內建VAD（pyannote/Silero，可在GPU上運行）提取人聲時間段（毫秒級）"""
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    vad_model = load_vad_model_cached(vad_method, device)
+
+    # 對完整音頻運行VAD，並合併為不超過 Whisper 輸入窗口的片段（秒）
+    if audio is None:
+        audio = whisperx.load_audio(audio_path)
+    with torch.inference_mode():
+        speech = vad_model({"waveform": vad_model.preprocess_audio(audio), "sample_rate": SAMPLE_RATE})
+    merged = vad_model.merge_chunks(
+        speech,
+        MAX_CHUNK_SEC,
+        onset=VAD_OPTIONS["vad_onset"],
+        offset=VAD_OPTIONS["vad_offset"]
+    )
+
+    # 轉毫秒並過濾過短的片段
+    min_duration_ms = min_duration * 1000
+    voice_segments = []
+    for seg in merged:
+        voice_start = int(seg["start"] * 1000)
+        voice_end = int(seg["end"] * 1000)
+        if (voice_end - voice_start) > min_duration_ms:
+            voice_segments.append({"start": voice_start, "end": voice_end})
+    return voice_segments
+
+def _probe_duration(audio_path):
+    """使用ffprobe讀取音頻總時長（秒），無法獲取時返回None"""
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", audio_path],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+def _silencedetect_segments(audio_path, min_volume, min_duration, raw_path=None):
+    """使用FFmpeg silencedetect 提取音頻中的人聲時間段（毫秒級）
+
+    raw_path 爲 load_audio_cached 生成的 16kHz float32 原始數據（可選），傳入時直接分析該數據。
+    """
+    if raw_path is not None:
+        input_args = ["-f", "f32le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", raw_path]
+    else:
+        input_args = ["-i", audio_path]
+
     # FFmpeg命令：分析音頻音量，輸出靜音/非靜音時間段
     cmd = [
         "ffmpeg",
-        "-i", audio_path,
+        "-hide_banner", "-nostats",  # 不輸出版本信息和進度行，stderr 只保留需要解析的內容
+        *input_args,
+        "-map", "0:a:0",  # 只處理第一條音軌：視頻、字幕、封面等流不再被解碼
         "-af", f"silencedetect=noise={min_volume}dB:d={min_duration}",
         "-f", "null",
         "-"
     ]
 
-    # 執行FFmpeg命令並捕獲輸出
-    result = subprocess.run(cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
-    output = result.stderr
+    # 執行FFmpeg命令，逐行讀取stderr原始字節，邊運行邊解析（不做整體UTF-8解碼）
+    proc = subprocess.Popen(cmd, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL)
 
     # 解析FFmpeg輸出，提取人聲時間段
+    min_duration_ms = min_duration * 1000  # 最短人聲片段（毫秒），循環外計算一次
     voice_segments = []
     silence_start = None
+    total_seconds = None
+
+    last_line = b""
+    try:
+        for line in proc.stderr:
+            match = _SILENCE_RE.search(line)
+            if match is None:
+                last_line = line
+                # 音頻總時長（FFmpeg 啓動時輸出，用於處理末尾的人聲片段）
+                if total_seconds is None:
+                    duration_match = _DURATION_RE.search(line)
+                    if duration_match is not None:
+                        h, m, s = duration_match.groups()
+                        total_seconds = int(h) * 3600 + int(m) * 60 + float(s)
+                continue
+            kind, time_sec = match.group(1), float(match.group(2))
 
-    for line in output.split("\n"):
-        # 檢測靜音開始（意味着人聲結束）
-        if "silence_start:" in line:
-            try:
-                # 提取靜音開始時間（秒）
-                start_time = float(line.split("silence_start: ")[1].strip())
+            # 檢測靜音開始（意味着人聲結束）
+            if kind == b"start":
                 if silence_start is not None:
                     # 計算人聲片段：上一個靜音結束 到 當前靜音開始
                     voice_start = int(silence_start * 1000)  # 轉毫秒
-                    voice_end = int(start_time * 1000)
+                    voice_end = int(time_sec * 1000)
                     # 過濾過短的片段
-                    if (voice_end - voice_start) > (min_duration * 1000):
+                    if (voice_end - voice_start) > min_duration_ms:
                         voice_segments.append({"start": voice_start, "end": voice_end})
-            except:
-                continue
 
-        # 檢測靜音結束（意味着人聲開始）
-        elif "silence_end:" in line:
-            try:
-                # 提取靜音結束時間（秒）
-                silence_start = float(line.split("silence_end: ")[1].split(" |")[0].strip())
-            except:
-                continue
+            # 檢測靜音結束（意味着人聲開始）
+            else:
+                silence_start = time_sec
+    except BaseException:
+        # 解析中途出錯或被中斷時結束FFmpeg，避免殘留後台進程
+        proc.kill()
+        raise
+    finally:
+        proc.wait()
+
+    # FFmpeg 失敗（如文件損壞、格式不支援）時報錯，而不是當作沒有人聲
+    if proc.returncode != 0:
+        raise RuntimeError(f"FFmpeg 靜音檢測失敗: {last_line.decode(errors='replace').strip()}")
+
+    # 部分容器的 Duration 顯示爲 N/A，此時用 ffprobe 只讀取容器頭獲取時長
+    if silence_start is not None and total_seconds is None:
+        total_seconds = _probe_duration(audio_path)
 
     # 處理音頻末尾的人聲片段（如果最後不是靜音結束）
-    duration_cmd = [
-        "ffmpeg",
-        "-i", audio_path,
-        "-f", "null",
-        "-"
-    ]
-    duration_result = subprocess.run(duration_cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
-    for line in duration_result.stderr.split("\n"):
-        if "Duration:" in line:
-            try:
-                duration_str = line.split("Duration: ")[1].split(",")[0].strip()
-                h, m, s = duration_str.split(":")
-                total_seconds = int(h) * 3600 + int(m) * 60 + float(s)
-                total_ms = int(total_seconds * 1000)
-                # 如果最後有未結束的人聲片段
-                if silence_start is not None:
-                    voice_start = int(silence_start * 1000)
-                    voice_end = total_ms
-                    if (voice_end - voice_start) > (min_duration * 1000):
-                        voice_segments.append({"start": voice_start, "end": voice_end})
-            except:
-                continue
-
-    # 保存人聲片段到JSON
-    with open(output_json, "w", encoding="utf-8") as f:
-        json.dump(voice_segments, f, ensure_ascii=False, indent=2)
+    if silence_start is not None and total_seconds is not None:
+        voice_start = int(silence_start * 1000)
+        voice_end = int(total_seconds * 1000)
+        if (voice_end - voice_start) > min_duration_ms:
+            voice_segments.append({"start": voice_start, "end": voice_end})
 
-    print(f"✅ 提取到 {len(voice_segments)} 個人聲片段，已保存到 {output_json}")
     return voice_segments
 
 def format_time_srt(seconds):
@@ -181,151 +399,402 @@ def format_time_vtt(seconds):
     ms = int((seconds - int(seconds)) * 1000)
     return f"{hours:02d}:{minutes:02d}:{secs:02d}.{ms:03d}"
 
-def save_subtitle_formats(all_subtitles, base_filename, lang_suffix):
-    """保存多種格式的字幕文件"""
+def _format_times_kernel(seconds, sep, out):
+    """將秒數逐個寫成 HH:MM:SS{sep}mmm 的 ASCII 字節（每個 12 字節），計算方式與 format_time_srt 相同"""
+    for i in range(seconds.shape[0]):
+        t = seconds[i]
+        h = int(t // 3600)
+        m = int((t % 3600) // 60)
+        s = int(t % 60)
+        ms = int((t - int(t)) * 1000)
+        o = i * 12
+        out[o] = 48 + h // 10
+        out[o + 1] = 48 + h % 10
+        out[o + 2] = 58  # ":"
+        out[o + 3] = 48 + m // 10
+        out[o + 4] = 48 + m % 10
+        out[o + 5] = 58
+        out[o + 6] = 48 + s // 10
+        out[o + 7] = 48 + s % 10
+        out[o + 8] = sep
+        out[o + 9] = 48 + ms // 100
+        out[o + 10] = 48 + ms // 10 % 10
+        out[o + 11] = 48 + ms % 10
+
+# 首次調用時編譯，cache=True 將機器碼緩存到磁盤，之後的會話直接載入
+_format_times_jit = numba.njit(cache=True)(_format_times_kernel) if numba is not None else None
+
+def format_times_bulk(seconds, sep=","):
+    """批量轉換時間爲字幕格式 (HH:MM:SS{sep}mmm)，sep 爲 "," 時爲SRT，"." 時爲VTT"""
+    seconds = np.asarray(seconds, dtype=np.float64)
+
+    # 條數較多且小時數爲兩位時，用 numba 直接寫入定長字節緩衝區
+    if (_format_times_jit is not None and len(seconds) >= NUMBA_MIN_ITEMS
+            and seconds.min() >= 0 and seconds.max() < 100 * 3600):
+        out = np.empty(len(seconds) * 12, dtype=np.uint8)
+        _format_times_jit(seconds, ord(sep), out)
+        return out.view("S12").astype("U12").tolist()
+
+    hours = (seconds // 3600).astype(np.int64)
+    minutes = ((seconds % 3600) // 60).astype(np.int64)
+    secs = (seconds % 60).astype(np.int64)
+    ms = ((seconds - seconds.astype(np.int64)) * 1000).astype(np.int64)
+    return [
+        f"{h:02d}:{m:02d}:{s:02d}{sep}{x:03d}"
+        for h, m, s, x in zip(hours.tolist(), minutes.tolist(), secs.tolist(), ms.tolist())
+    ]
+
+def merge_short_segments(voice_segments, max_duration=MAX_CHUNK_SEC):
+    """將相鄰的短人聲片段合併爲不超過 Whisper 輸入窗口（秒）的片段（毫秒級）
+
+    每個片段在識別時都會被補齊到 30 秒，合併後批量推理的每個窗口都盡量被語音填滿。
+    """
+    max_ms = int(max_duration * 1000)
+    merged = []
+    for seg in voice_segments:
+        if merged and seg["end"] - merged[-1]["start"] <= max_ms:
+            merged[-1]["end"] = seg["end"]
+        else:
+            merged.append({"start": seg["start"], "end": seg["end"]})
+    return merged
+
+def split_long_segments(voice_segments, max_duration=MAX_CHUNK_SEC):
+    """將超過 Whisper 輸入窗口（秒）的人聲片段切分為多個子片段（毫秒級）"""
+    max_ms = int(max_duration * 1000)
+    chunks = []
+    for seg in voice_segments:
+        start = seg["start"]
+        while seg["end"] - start > max_ms:
+            chunks.append({"start": start, "end": start + max_ms})
+            start += max_ms
+        chunks.append({"start": start, "end": seg["end"]})
+    return chunks
+
+def iter_subtitle_formats(subtitles, base_filename, lang_suffix):
+    """按格式逐行生成字幕內容，返回 {文件名: 行生成器}
+
+    subtitles 爲列式結構 {"start_sec": ndarray, "end_sec": ndarray, "text": list}，
+    可選的 "separator" 爲 TXT 段落內相鄰字幕之間的連接符（默認不加）。字幕編號按順序從 1 開始。各格式內容邊生成邊寫出，不在內存中拼接完整文本。
+    """
     # 生成帶語言後綴的基礎文件名
     file_base = f"{base_filename}.{lang_suffix}"
 
+    # 批量轉換時間格式
+    starts = np.asarray(subtitles["start_sec"], dtype=np.float64)
+    ends = np.asarray(subtitles["end_sec"], dtype=np.float64)
+    texts = subtitles["text"]
+    separator = subtitles.get("separator", "")
+    start_srt = format_times_bulk(starts, ",")
+    end_srt = format_times_bulk(ends, ",")
+    # VTT 與 SRT 只差毫秒分隔符，直接替換而不重複計算一遍時分秒
+    start_vtt = [t.replace(",", ".") for t in start_srt]
+    end_vtt = [t.replace(",", ".") for t in end_srt]
+    start_ms = (starts * 1000).astype(np.int64).tolist()
+    end_ms = (ends * 1000).astype(np.int64).tolist()
+    ids = range(1, len(texts) + 1)
+
     # 1. SRT格式
-    srt_file = f"{file_base}.srt"
-    with open(srt_file, "w", encoding="utf-8") as f:
-        for sub in all_subtitles:
-            f.write(f"{sub['id']}\n")
-            f.write(f"{sub['start_srt']} --> {sub['end_srt']}\n")
-            f.write(f"{sub['text']}\n\n")
+    def srt_lines():
+        for i, s, e, t in zip(ids, start_srt, end_srt, texts):
+            yield f"{i}\n{s} --> {e}\n{t}\n\n"
 
     # 2. VTT格式
-    vtt_file = f"{file_base}.vtt"
-    with open(vtt_file, "w", encoding="utf-8") as f:
-        f.write("WEBVTT\n\n")
-        for sub in all_subtitles:
-            f.write(f"{sub['start_vtt']} --> {sub['end_vtt']}\n")
-            f.write(f"{sub['text']}\n\n")
+    def vtt_lines():
+        yield "WEBVTT\n\n"
+        for s, e, t in zip(start_vtt, end_vtt, texts):
+            yield f"{s} --> {e}\n{t}\n\n"
 
     # 3. TSV格式
-    tsv_file = f"{file_base}.tsv"
-    with open(tsv_file, "w", encoding="utf-8") as f:
-        f.write("ID\tStart(ms)\tEnd(ms)\tStart\tEnd\tText\n")
-        for sub in all_subtitles:
-            start_ms = int(sub['start_sec'] * 1000)
-            end_ms = int(sub['end_sec'] * 1000)
-            f.write(f"{sub['id']}\t{start_ms}\t{end_ms}\t{sub['start_srt']}\t{sub['end_srt']}\t{sub['text']}\n")
-
-    # 4. TXT格式（純文本）
-    txt_file = f"{file_base}.txt"
-    with open(txt_file, "w", encoding="utf-8") as f:
-        full_text = "".join([sub['text'] for sub in all_subtitles])
-        f.write(full_text)
-
-    return [srt_file, vtt_file, tsv_file, txt_file]
-
-def transcribe_with_whisperx(audio_path, voice_segments, base_filename, lang="zh", initial_prompt="", model_size="base"):
-    """使用WhisperX對人聲片段進行逐字精準對齊，生成多格式字幕"""
+    def tsv_lines():
+        yield "ID\tStart(ms)\tEnd(ms)\tStart\tEnd\tText\n"
+        for i, sm, em, s, e, t in zip(ids, start_ms, end_ms, start_srt, end_srt, texts):
+            yield f"{i}\t{sm}\t{em}\t{s}\t{e}\t{t}\n"
+
+    # 4. TXT格式（純文本，停頓超過 LINE_BREAK_THRESHOLD 秒處分段）
+    def txt_lines():
+        gaps = starts[1:] - ends[:-1]
+        break_idx = (np.nonzero(gaps > LINE_BREAK_THRESHOLD)[0] + 1).tolist()
+        bounds = [0] + break_idx + [len(texts)]
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            # 分段換行單獨寫出，不再與段落文本拼接出新字符串；
+            # str.join 對生成器也會先轉成列表，列表切片已是最省的輸入
+            if a:
+                yield "\n"
+            yield separator.join(texts[a:b])
+
+    return {
+        f"{file_base}.srt": srt_lines(),
+        f"{file_base}.vtt": vtt_lines(),
+        f"{file_base}.tsv": tsv_lines(),
+        f"{file_base}.txt": txt_lines(),
+    }
+
+def save_subtitle_formats(subtitles, base_filename, lang_suffix):
+    """保存多種格式的字幕文件（SRT、VTT、TSV、TXT），返回文件路徑列表"""
+    contents = iter_subtitle_formats(subtitles, base_filename, lang_suffix)
+    # 逐行流式寫入，由 1MB 文件緩衝區合併成大塊寫出
+    for path, lines in contents.items():
+        with open(path, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+            f.writelines(lines)
+    return list(contents)
+
+def zip_add_file(zipf, file_path, arcname):
+    """將文件加入壓縮包；小文件壓縮收益有限，直接存儲以省去壓縮開銷"""
+    if os.path.getsize(file_path) < ZIP_STORE_MAX_BYTES:
+        zipf.write(file_path, arcname, compress_type=zipfile.ZIP_STORED)
+    else:
+        zipf.write(file_path, arcname)
+
+def to_half_precision(model_a):
+    """將對齊模型轉爲FP16：輸入波形轉半精度，輸出logits轉回FP32供後續回溯計算"""
+    def cast_input(module, args):
+        return tuple(a.half() if torch.is_tensor(a) and a.is_floating_point() else a for a in args)
+
+    def cast_output(module, args, output):
+        # torchaudio 模型返回 (emissions, lengths)，HuggingFace 模型返回帶 logits 的對象
+        if isinstance(output, tuple):
+            return (output[0].float(),) + tuple(output[1:])
+        output.logits = output.logits.float()
+        return output
+
+    model_a = model_a.half()
+    model_a.register_forward_pre_hook(cast_input)
+    model_a.register_forward_hook(cast_output)
+    return model_a
+
+def select_compute_settings(device):
+    """按設備選擇 CTranslate2 (faster-whisper) 的量化類型與批量大小，返回 (compute_type, batch_size)
+
+    Ampere 及以上 (計算能力 8.x+) 用 int8 權重 + bfloat16 計算，數值範圍更大且張量核心吞吐相同；
+    Volta/Turing（如 Colab T4，7.5）用 int8 + float16；更舊的 GPU 不支援高效的半精度/int8，退回 float32；
+    CPU 上用純 int8。
+    """
+    if device != "cuda":
+        return "int8", 4
+    major, _ = torch.cuda.get_device_capability()
+    if major >= 8:
+        return "int8_bfloat16", 32
+    if major >= 7:
+        return "int8_float16", 16
+    return "float32", 8
+
+def _evict_cached_models(kind, device):
+    """從緩存中移除指定類型的模型並釋放顯存（僅在確實有模型被移除時清理）"""
+    old_keys = [k for k in _MODEL_CACHE if k[0] == kind]
+    if not old_keys:
+        return
+    for old_key in old_keys:
+        del _MODEL_CACHE[old_key]
+    gc.collect()
+    if device == "cuda":
+        torch.cuda.empty_cache()
+
+def load_vad_model_cached(vad_method, device):
+    """加載WhisperX內建VAD模型（pyannote/silero），同一方法/設備在會話內只構建一次"""
+    key = ("vad", vad_method, device)
+    with _VAD_LOCK:
+        if key not in _MODEL_CACHE:
+            from whisperx.vads import Pyannote, Silero
+
+            if vad_method == "pyannote":
+                _MODEL_CACHE[key] = Pyannote(torch.device(device), **VAD_OPTIONS)
+            elif vad_method == "silero":
+                _MODEL_CACHE[key] = Silero(**VAD_OPTIONS)
+            else:
+                raise ValueError(f"不支援的 VAD 方法: {vad_method}")
+        return _MODEL_CACHE[key]
+
+def load_whisper_model_cached(model_size, device, compute_type, lang, initial_prompt=""):
+    """加載Whisper模型，相同模型大小/語言/設備/精度在會話內重用已加載的模型"""
+    key = ("asr", model_size, lang, device, compute_type)
+    model = _MODEL_CACHE.get(key)
+    if model is None:
+        # 只保留一個Whisper模型：切換模型大小或語言時先釋放舊模型的顯存
+        _evict_cached_models("asr", device)
+
+        # faster-whisper 後端，貪婪解碼；傳入緩存的 pyannote VAD，
+        # 避免 load_model 每次再構建一個
+        model = whisperx.load_model(
+            model_size,
+            device,
+            compute_type=compute_type,
+            language=lang,
+            asr_options={"beam_size": 1},
+            vad_model=load_vad_model_cached("pyannote", device)
+        )
+        _MODEL_CACHE[key] = model
+
+    # 初始提示詞每次運行可能不同，直接更新批量推理管線的解碼選項
+    model.options = replace(model.options, initial_prompt=initial_prompt or None)
+    return model
+
+def load_align_model_cached(lang, device):
+    """加載對齊模型，同一語言在會話內重用已加載的模型（GPU上使用FP16）"""
+    key = ("align", lang, device)
+    if key not in _MODEL_CACHE:
+        # 同樣只保留一個對齊模型，避免多次切換語言後顯存被舊模型佔滿
+        _evict_cached_models("align", device)
+        model_a, metadata = whisperx.load_align_model(language_code=lang, device=device)
+        # 只做推理：確保關閉 dropout 等訓練行爲
+        model_a.eval()
+        if device == "cuda":
+            model_a = to_half_precision(model_a)
+        _MODEL_CACHE[key] = (model_a, metadata)
+    return _MODEL_CACHE[key]
+
+def align_chunk(chunk, audio, text, model_a, metadata, device):
+    """對單個片段進行逐字對齊，以列式結構返回 (絕對開始秒陣列, 絕對結束秒陣列, 字符列表)"""
+    start_sec = chunk["start"] / 1000
+    duration_sec = (chunk["end"] - chunk["start"]) / 1000
+
+    # inference_mode 是線程局部的，對齊在線程池中運行，需在工作線程內開啓
+    with torch.inference_mode():
+        result_aligned = whisperx.align(
+            [{"text": text, "start": 0.0, "end": duration_sec}],
+            model_a,
+            metadata,
+            audio,
+            device,
+            return_char_alignments=True
+        )
+
+    rel_starts, rel_ends, texts = [], [], []
+    for word_seg in result_aligned["segments"]:
+        for char in word_seg.get("chars") or []:
+            char_text = char.get("char")
+
+            # 過濾空字符（isspace 直接判斷，不像 strip 那樣爲每個字符生成新字符串）
+            if not char_text or char_text.isspace():
+                continue
+
+            # 對齊模型字典外的字符（如中文標點、數字）沒有時間戳，跳過
+            if "start" not in char or "end" not in char:
+                continue
+
+            rel_starts.append(char["start"])
+            rel_ends.append(char["end"])
+            texts.append(char_text)
+
+    # 整列加上片段起始時間，得到字符的絕對時間
+    abs_starts = start_sec + np.asarray(rel_starts, dtype=np.float64)
+    abs_ends = start_sec + np.asarray(rel_ends, dtype=np.float64)
+
+    # 片段已合併爲最長 30 秒的窗口，個別字符時間無效（None/NaN）時只丟棄該字符，不丟棄整個窗口
+    valid = np.isfinite(abs_starts) & np.isfinite(abs_ends)
+    if not valid.all():
+        abs_starts, abs_ends = abs_starts[valid], abs_ends[valid]
+        texts = [t for t, ok in zip(texts, valid.tolist()) if ok]
+    return abs_starts, abs_ends, texts
+
+def segment_chunk(chunk, text):
+    """不做對齊，將整個片段作爲一條字幕，返回與 align_chunk 相同的列式結構"""
+    text = text.strip()
+    if not text:
+        return np.zeros(0), np.zeros(0), []
+    return np.array([chunk["start"] / 1000]), np.array([chunk["end"] / 1000]), [text]
+
+def transcribe_with_whisperx(audio_path, voice_segments, base_filename, lang="zh", initial_prompt="", model_size="base", audio=None, char_align=True):
+    """使用WhisperX對人聲片段進行逐字精準對齊，生成多格式字幕
+
+    audio 爲已解碼的 16kHz 波形（可選），未傳入時在加載模型的同時於後台解碼 audio_path。
+    char_align 爲 False 時跳過對齊模型，每個人聲片段輸出一條整句字幕。
+    """
     # 設置設備（自動檢測GPU/CPU）
     device = "cuda" if torch.cuda.is_available() else "cpu"
-    batch_size = 16 if torch.cuda.is_available() else 4
-    compute_type = "float16" if torch.cuda.is_available() else "int8"
+    # 按 GPU 計算能力選擇量化類型與批量大小
+    compute_type, batch_size = select_compute_settings(device)
 
-    print(f"⚙️ 使用設備: {device}")
+    print(f"⚙️ 使用設備: {device} (compute_type={compute_type})")
     print(f"⚙️ 模型大小: {model_size}, 語言: {lang}")
     print(f"⚙️ 初始提示詞: {initial_prompt}")
 
-    # 1. 加載WhisperX模型
-    model = whisperx.load_model(
-        model_size,
-        device,
-        compute_type=compute_type,
-        language=lang
-    )
-
-    # 2. 加載對齊模型
-    model_a, metadata = whisperx.load_align_model(language_code=lang, device=device)
-
-    # 存儲所有字幕片段
-    all_subtitles = []
-    segment_id = 1
+    # 未提供已解碼音頻時，在後台線程中用FFmpeg解碼整個音頻，與模型加載重疊進行
+    if audio is None:
+        decode_executor = ThreadPoolExecutor(max_workers=1)
+        audio_future = decode_executor.submit(load_audio_cached, audio_path)
+        decode_executor.shutdown(wait=False)
+
+    # 1. 加載WhisperX模型（會話內緩存，重複運行時跳過加載）
+    model = load_whisper_model_cached(model_size, device, compute_type, lang, initial_prompt)
+
+    # 2. 取得一次性解碼的整個音頻（16kHz float32），後續在內存中切片
+    full_audio = audio if audio is not None else audio_future.result()
+    del audio
+
+    # 3. 將人聲片段合併/切分爲不超過 Whisper 輸入窗口的片段，並在內存中切出音頻；
+    #    不做逐字對齊時不合併短片段，每個人聲片段即一條字幕
+    segments = merge_short_segments(voice_segments) if char_align else voice_segments
+    chunks = split_long_segments(segments)
+    # 各片段只是整段音頻（內存映射）的視圖，不複製數據，也不會單獨佔用內存
+    segment_audios = [
+        full_audio[chunk["start"] * SAMPLES_PER_MS:chunk["end"] * SAMPLES_PER_MS]
+        for chunk in chunks
+    ]
 
-    # 3. 逐個處理人聲片段
-    for seg in voice_segments:
-        start_ms = seg["start"]
-        end_ms = seg["end"]
-        start_sec = start_ms / 1000
-        end_sec = end_ms / 1000
-        duration_sec = end_sec - start_sec
+    # 4. 加載對齊模型（僅逐字對齊時需要；同一語言在會話內只加載一次）
+    if char_align:
+        model_a, metadata = load_align_model_cached(lang, device)
 
-        print(f"\n🔤 處理片段 {segment_id}: {start_ms}ms - {end_ms}ms (時長: {duration_sec:.2f}秒)")
+    # 以列式結構存儲所有字幕：時間按片段整塊收集，最後一次拼接
+    starts, ends, texts = [], [], []
 
-        # 臨時切割音頻片段
-        temp_audio = f"temp_segment_{segment_id}.wav"
+    # 5. 批量識別所有片段（一次提交給 GPU，由 batch_size 控制並行度）；
+    # 6. 每得到一個片段的識別結果就立即提交到線程池進行逐字對齊，
+    #    對齊（CPU回溯 + 前向計算）與後續批次的識別同時進行
+    print(f"\n🔤 批量識別 {len(chunks)} 個片段 (batch_size={batch_size})")
+    with ThreadPoolExecutor(max_workers=ALIGN_WORKERS) as executor:
         try:
-            # 使用FFmpeg切割音頻片段
-            subprocess.run([
-                "ffmpeg",
-                "-ss", str(start_sec),
-                "-to", str(end_sec),
-                "-i", audio_path,
-                "-vn", "-acodec", "pcm_s16le",
-                "-y", temp_audio
-            ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-            # 4. 識別音頻片段（帶初始提示詞）
-            audio = whisperx.load_audio(temp_audio)
-            result = model.transcribe(
-                audio,
-                batch_size=batch_size,
-                initial_prompt=initial_prompt
-            )
-
-            # 5. 精準對齊（逐字級別）
-            result_aligned = whisperx.align(
-                result["segments"],
-                model_a,
-                metadata,
-                audio,
-                device,
-                return_char_alignments=True
-            )
-
-            # 6. 處理對齊結果
-            for word_seg in result_aligned["segments"]:
-                for char in word_seg["char_alignments"]:
-                    # 計算字符的絕對時間（加上片段起始時間）
-                    char_start = start_sec + char["start"]
-                    char_end = start_sec + char["end"]
-                    char_text = char["char"]
-
-                    # 過濾空字符
-                    if char_text.strip() == "":
-                        continue
-
-                    # 轉換多種時間格式
-                    start_srt = format_time_srt(char_start)
-                    end_srt = format_time_srt(char_end)
-                    start_vtt = format_time_vtt(char_start)
-                    end_vtt = format_time_vtt(char_end)
-
-                    # 添加到字幕列表
-                    all_subtitles.append({
-                        "id": len(all_subtitles) + 1,
-                        "start_sec": char_start,
-                        "end_sec": char_end,
-                        "start_srt": start_srt,
-                        "end_srt": end_srt,
-                        "start_vtt": start_vtt,
-                        "end_vtt": end_vtt,
-                        "text": char_text
-                    })
-
-        except Exception as e:
-            print(f"❌ 處理片段 {segment_id} 出錯: {e}")
-        finally:
-            # 刪除臨時音頻文件
-            if os.path.exists(temp_audio):
-                os.remove(temp_audio)
-
-        segment_id += 1
-
-    return all_subtitles
+            futures = []
+            # num_workers=0：與 FasterWhisperPipeline.transcribe 一致，在本進程內提取特徵，
+            # 不讓 DataLoader 派生子進程並經 IPC 傳遞每個片段的 log-mel
+            outputs = model(({"inputs": audio} for audio in segment_audios),
+                            batch_size=batch_size, num_workers=0)
+            for chunk, audio, out in zip(chunks, segment_audios, outputs):
+                text = out["text"]
+                if batch_size in [0, 1, None]:
+                    text = text[0]
+                if char_align:
+                    futures.append(executor.submit(align_chunk, chunk, audio, text, model_a, metadata, device))
+                else:
+                    futures.append(executor.submit(segment_chunk, chunk, text))
+
+            # 7. 按片段順序收集對齊結果
+            for segment_id, (chunk, future) in enumerate(zip(chunks, futures), start=1):
+                start_ms = chunk["start"]
+                end_ms = chunk["end"]
+                duration_sec = (end_ms - start_ms) / 1000
+
+                print(f"\n🔤 處理片段 {segment_id}: {start_ms}ms - {end_ms}ms (時長: {duration_sec:.2f}秒)")
+
+                try:
+                    seg_starts, seg_ends, seg_texts = future.result()
+                except (RuntimeError, ValueError, IndexError) as e:
+                    # 只跳過對齊/推理中的數據或顯存錯誤，其他異常（程序錯誤、中斷）照常拋出
+                    print(f"❌ 處理片段 {segment_id} 出錯: {e}")
+                    logger.debug("片段 %d (%dms - %dms) 處理失敗", segment_id, start_ms, end_ms, exc_info=True)
+                    continue
+                finally:
+                    # 定期歸還對齊過程中的顯存碎片
+                    if device == "cuda" and segment_id % EMPTY_CACHE_EVERY == 0:
+                        torch.cuda.empty_cache()
+
+                # 添加到各字幕列
+                starts.append(seg_starts)
+                ends.append(seg_ends)
+                texts.extend(seg_texts)
+        except BaseException:
+            # 出錯或被中斷（如 Colab 停止按鈕）時取消尚未開始的對齊任務，
+            # 不讓 with 退出時等待所有排隊片段都處理完
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    return {
+        "start_sec": np.concatenate(starts) if starts else np.zeros(0),
+        "end_sec": np.concatenate(ends) if ends else np.zeros(0),
+        "text": texts,
+        # 整句字幕在 TXT 中拼接時，以空格分詞的語言需在句間補回空格
+        "separator": "" if char_align or lang in NO_SPACE_LANGS else " "
+    }
 
 # ===================== Colab交互界面 =====================
 def main_interface():
@@ -449,6 +918,14 @@ def main_interface():
 
     display(model_selector)
 
+    # 逐字對齊開關：關閉時跳過對齊模型，按人聲片段輸出整句字幕
+    char_align_checkbox = widgets.Checkbox(
+        value=True,
+        description='逐字對齊',
+        style={'description_width': 'initial'}
+    )
+    display(char_align_checkbox)
+
     # 6. 執行按鈕
     print("\n🚀 開始轉換:")
     run_button = widgets.Button(
@@ -470,6 +947,7 @@ def main_interface():
         selected_lang_code = lang_info["code"]   # 傳給 WhisperX 的語言參數（基礎代碼）
         lang_suffix = lang_info["suffix"]        # 用於檔案名稱的後綴
         selected_model = model_options[model_selector.value]
+        char_align = char_align_checkbox.value
 
         # 處理提示詞
         if prompt_selector.value == "[新增] 自定義提示詞" and custom_prompt.value.strip():
@@ -506,47 +984,68 @@ def main_interface():
         audio_basename = os.path.splitext(os.path.basename(audio_file_path))[0]
 
         try:
+            # 在後台線程中先行加載 Whisper 模型（存入會話緩存），與音頻解碼和人聲檢測重疊進行
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            compute_type, _ = select_compute_settings(device)
+            model_executor = ThreadPoolExecutor(max_workers=1)
+            model_future = model_executor.submit(
+                load_whisper_model_cached, selected_model, device, compute_type,
+                selected_lang_code, selected_prompt
+            )
+            model_executor.shutdown(wait=False)
+
+            # 一次性解碼整個音頻（16kHz float32，緩存於內存文件系統），供人聲檢測、識別與對齊共用
+            full_audio = load_audio_cached(audio_file_path)
+
             # 步驟1：提取人聲片段
             print("\n🔍 正在分析音頻，提取人聲片段...")
-            segments_json = f"{audio_basename}.voice_segments.{lang_suffix}.json"
-            voice_segments = extract_voice_segments(audio_file_path, segments_json)
+            # 手動上傳的結果直接寫入臨時目錄，省去事後逐個移動文件
+            output_dir = "." if is_drive_file else temp_dir
+            segments_json = os.path.join(output_dir, f"{audio_basename}.voice_segments.{lang_suffix}.json")
+            voice_segments = extract_voice_segments(audio_file_path, segments_json, audio=full_audio)
 
             if not voice_segments:
                 print("❌ 未檢測到人聲片段！")
                 return
 
-            # 步驟2：WhisperX逐字對齊
-            print("\n🎙️ 正在進行語音識別和逐字對齊...")
+            # 步驟2：WhisperX識別（可選逐字對齊）；等待預加載完成（加載失敗時在此拋出），
+            #        transcribe_with_whisperx 隨後直接命中模型緩存
+            model_future.result()
+            print("\n🎙️ 正在進行語音識別和逐字對齊..." if char_align else "\n🎙️ 正在進行語音識別（按片段輸出字幕）...")
             all_subtitles = transcribe_with_whisperx(
                 audio_file_path,
                 voice_segments,
                 audio_basename,
                 lang=selected_lang_code,          # 傳遞基礎語言代碼
                 initial_prompt=selected_prompt,
-                model_size=selected_model
+                model_size=selected_model,
+                audio=full_audio,
+                char_align=char_align
             )
+            del full_audio
 
-            # 步驟3：保存多種格式字幕（使用地區後綴）
-            print("\n💾 正在保存字幕文件...")
-            subtitle_files = save_subtitle_formats(all_subtitles, audio_basename, lang_suffix)
-            subtitle_files.append(segments_json)  # 加入人聲片段JSON
-
-            # 步驟4：處理輸出文件
+            # 步驟3+4：生成多種格式字幕（使用地區後綴）並處理輸出文件
             if is_drive_file:
-                # 雲端硬盤文件：打包保存到subtitle_output
+                # 雲端硬盤文件：字幕內容直接從內存打包保存到subtitle_output，不經過本地磁盤
+                print("\n💾 正在打包字幕文件...")
+                subtitle_contents = iter_subtitle_formats(all_subtitles, audio_basename, lang_suffix)
                 zip_filename = f"{audio_basename}.subtitles.{lang_suffix}.zip"
                 zip_path = f"{output_drive_path}/{zip_filename}"
 
-                # 打包文件
-                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for file in subtitle_files:
-                        if os.path.exists(file):
-                            zipf.write(file, os.path.basename(file))
+                # 打包文件（文本壓縮率高，使用最快的壓縮級別）
+                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
+                    for file, lines in subtitle_contents.items():
+                        # 逐行流式寫入壓縮包，不在內存中拼接完整字幕；
+                        # 緩衝後按大塊送入壓縮器，避免每行調用一次 zlib
+                        entry = io.BufferedWriter(zipf.open(os.path.basename(file), "w"), WRITE_BUFFER_SIZE)
+                        with io.TextIOWrapper(entry, encoding="utf-8", newline="") as zf:
+                            zf.writelines(lines)
+                    if os.path.exists(segments_json):
+                        zip_add_file(zipf, segments_json, os.path.basename(segments_json))
 
                 # 清理臨時文件
-                for file in subtitle_files:
-                    if os.path.exists(file):
-                        os.remove(file)
+                if os.path.exists(segments_json):
+                    os.remove(segments_json)
 
                 print(f"\n🎉 處理完成！")
                 print(f"📦 字幕文件已打包保存到雲端硬盤:")
@@ -555,9 +1054,8 @@ def main_interface():
 
             else:
                 # 手動上傳文件：保存到臨時目錄並提示下載
-                for file in subtitle_files:
-                    if os.path.exists(file):
-                        shutil.move(file, temp_dir)
+                print("\n💾 正在保存字幕文件...")
+                save_subtitle_formats(all_subtitles, os.path.join(temp_dir, audio_basename), lang_suffix)
 
                 print(f"\n🎉 處理完成！")
                 print(f"📂 字幕文件已保存到臨時目錄: {temp_dir}")
@@ -574,10 +1072,10 @@ def main_interface():
                 # 提供打包下載
                 zip_filename = f"{audio_basename}.subtitles.{lang_suffix}.zip"
                 zip_path = f"/content/{zip_filename}"
-                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
                     for file in os.listdir(temp_dir):
                         file_path = f"{temp_dir}/{file}"
-                        zipf.write(file_path, file)
+                        zip_add_file(zipf, file_path, file)
 
                 print(f"\n📦 也可以下載打包文件：")
                 display(HTML(f'<a href="files/{zip_path}" download="{zip_filename}">📥 下載全部文件 ({zip_filename})</a>'))
@@ -590,13 +1088,27 @@ def main_interface():
     run_button.on_click(on_run_click)
 
 # ===================== 安裝依賴 =====================
+# pip 包名 -> 導入模塊名
+REQUIRED_PACKAGES = {
+    "ffmpeg-python": "ffmpeg",
+    "whisperx": "whisperx",
+    "soundfile": "soundfile",
+    "numpy": "numpy",
+    "torchaudio": "torchaudio",
+    "transformers": "transformers",
+}
+
 def install_dependencies():
-    print("📦 正在安裝必要依賴...")
-    # 安裝FFmpeg - 取消PIPE，打印日誌，確保安裝成功
-    subprocess.run(["apt", "update"], check=True)
-    subprocess.run(["apt", "install", "-y", "ffmpeg"], check=True)
-    # 安裝Python包 - 補全WhisperX核心依賴，取消-q屏蔽日誌，跳過預裝的torch
-    subprocess.run(["pip", "install", "ffmpeg-python", "whisperx", "soundfile", "numpy", "torchaudio", "transformers"], check=True)
+    print("📦 正在檢查必要依賴...")
+    # 安裝FFmpeg - 已存在則跳過；取消PIPE，打印日誌，確保安裝成功
+    if shutil.which("ffmpeg") is None:
+        subprocess.run(["apt", "update"], check=True)
+        subprocess.run(["apt", "install", "-y", "ffmpeg"], check=True)
+    # 安裝Python包 - 只安裝尚未可導入的包，優先使用預編譯wheel；取消-q屏蔽日誌，跳過預裝的torch
+    missing = [pkg for pkg, module in REQUIRED_PACKAGES.items() if importlib.util.find_spec(module) is None]
+    if missing:
+        print(f"📦 正在安裝: {', '.join(missing)}")
+        subprocess.run(["pip", "install", "--prefer-binary", *missing], check=True)
     print("✅ 依賴安裝完成！")
 
 # 執行安裝和啓動界面
@@ -5,6 +5,8 @@ import os
 import json
 import tempfile
 import unittest
+import zipfile
+import numpy as np
 from unittest.mock import patch, MagicMock
 
 # 導入主模塊
@@ -13,8 +15,13 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from WhisperX_ffmpeg_2_Subtitle import (
     format_time_srt,
     format_time_vtt,
+    format_times_bulk,
     load_saved_prompts,
-    save_prompt
+    save_prompt,
+    save_subtitle_formats,
+    merge_short_segments,
+    split_long_segments,
+    zip_add_file
 )
 
 class TestSubtitleTools(unittest.TestCase):
@@ -33,6 +40,105 @@ class TestSubtitleTools(unittest.TestCase):
         self.assertEqual(format_time_vtt(1.5), "00:00:01.500")
         self.assertEqual(format_time_vtt(3661.123), "01:01:01.123")
 
+    def test_format_times_bulk(self):
+        """測試批量時間格式化與逐個轉換結果一致"""
+        seconds = [0, 1.5, 3661.123, 59.999, 7325.042]
+        self.assertEqual(format_times_bulk(seconds, ","), [format_time_srt(t) for t in seconds])
+        self.assertEqual(format_times_bulk(seconds, "."), [format_time_vtt(t) for t in seconds])
+        self.assertEqual(format_times_bulk([], ","), [])
+
+    def test_format_times_kernel(self):
+        """測試 numba 內核（以純 Python 執行）與逐個轉換結果一致"""
+        from WhisperX_ffmpeg_2_Subtitle import _format_times_kernel, format_times_bulk
+        seconds = np.array([0, 1.5, 3661.123, 59.999, 7325.042, 359999.999])
+        out = np.empty(len(seconds) * 12, dtype=np.uint8)
+        _format_times_kernel(seconds, ord(","), out)
+        self.assertEqual(out.view("S12").astype("U12").tolist(),
+                         [format_time_srt(t) for t in seconds])
+
+        # 條數超過閾值時（已安裝 numba 則走編譯路徑）結果不變
+        many = np.tile(seconds, 300)
+        with patch('WhisperX_ffmpeg_2_Subtitle.NUMBA_MIN_ITEMS', 1000):
+            self.assertEqual(format_times_bulk(many, "."), [format_time_vtt(t) for t in many])
+
+    def test_split_long_segments(self):
+        """測試超長人聲片段切分"""
+        # 短片段保持不變
+        self.assertEqual(split_long_segments([{"start": 0, "end": 1500}]),
+                         [{"start": 0, "end": 1500}])
+        # 超過 30 秒的片段按窗口切分
+        chunks = split_long_segments([{"start": 1000, "end": 71000}])
+        self.assertEqual(chunks, [
+            {"start": 1000, "end": 31000},
+            {"start": 31000, "end": 61000},
+            {"start": 61000, "end": 71000},
+        ])
+
+    def test_save_subtitle_formats(self):
+        """測試多格式字幕輸出"""
+        subtitles = {
+            "start_sec": np.array([1.5, 1.75, 3.5]),
+            "end_sec": np.array([1.75, 2.0, 3.75]),
+            "text": ["你", "好", "嗎"],
+        }
+        with tempfile.TemporaryDirectory() as tmpdir:
+            srt_file, vtt_file, tsv_file, txt_file = save_subtitle_formats(
+                subtitles, os.path.join(tmpdir, "demo"), "zh-TW")
+
+            with open(srt_file, encoding="utf-8") as f:
+                self.assertEqual(f.read(),
+                                 "1\n00:00:01,500 --> 00:00:01,750\n你\n\n"
+                                 "2\n00:00:01,750 --> 00:00:02,000\n好\n\n"
+                                 "3\n00:00:03,500 --> 00:00:03,750\n嗎\n\n")
+            with open(vtt_file, encoding="utf-8") as f:
+                self.assertEqual(f.read(),
+                                 "WEBVTT\n\n"
+                                 "00:00:01.500 --> 00:00:01.750\n你\n\n"
+                                 "00:00:01.750 --> 00:00:02.000\n好\n\n"
+                                 "00:00:03.500 --> 00:00:03.750\n嗎\n\n")
+            with open(tsv_file, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            self.assertEqual(lines[0], "ID\tStart(ms)\tEnd(ms)\tStart\tEnd\tText")
+            self.assertEqual(lines[1], "1\t1500\t1750\t00:00:01,500\t00:00:01,750\t你")
+            with open(txt_file, encoding="utf-8") as f:
+                # 停頓超過 1 秒處分段
+                self.assertEqual(f.read(), "你好\n嗎")
+
+    def test_merge_short_segments(self):
+        """測試相鄰短人聲片段合併"""
+        segments = [
+            {"start": 0, "end": 5000},
+            {"start": 6000, "end": 20000},
+            {"start": 21000, "end": 29000},
+            {"start": 31000, "end": 40000},
+            {"start": 41000, "end": 90000},
+        ]
+        self.assertEqual(merge_short_segments(segments), [
+            {"start": 0, "end": 29000},
+            {"start": 31000, "end": 40000},
+            {"start": 41000, "end": 90000},
+        ])
+        # 不修改輸入
+        self.assertEqual(segments[0], {"start": 0, "end": 5000})
+
+    def test_zip_add_file(self):
+        """小文件直接存儲，大文件使用壓縮包默認的壓縮方式"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            small = os.path.join(tmpdir, "small.srt")
+            large = os.path.join(tmpdir, "large.srt")
+            with open(small, "w", encoding="utf-8") as f:
+                f.write("1\n00:00:01,500 --> 00:00:01,750\n你\n\n")
+            with open(large, "w", encoding="utf-8") as f:
+                f.write("字" * 4096)
+            zip_path = os.path.join(tmpdir, "out.zip")
+            with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
+                zip_add_file(zipf, small, "small.srt")
+                zip_add_file(zipf, large, "large.srt")
+            with zipfile.ZipFile(zip_path) as zipf:
+                self.assertEqual(zipf.getinfo("small.srt").compress_type, zipfile.ZIP_STORED)
+                self.assertEqual(zipf.getinfo("large.srt").compress_type, zipfile.ZIP_DEFLATED)
+                self.assertEqual(zipf.read("large.srt").decode("utf-8"), "字" * 4096)
+
     def test_prompt_save_load(self):
         """測試提示詞保存和載入"""
         with tempfile.TemporaryDirectory() as tmpdir:
@@ -53,39 +159,325 @@ class TestSubtitleTools(unittest.TestCase):
                 loaded = load_saved_prompts()
                 self.assertIn(new_prompt, loaded)
 
+    @patch('WhisperX_ffmpeg_2_Subtitle.orjson', None)
+    def test_json_fallback_roundtrip(self):
+        """未安裝 orjson 時退回標準庫，中文不轉義且可正確讀回"""
+        from WhisperX_ffmpeg_2_Subtitle import dump_json, load_json
+        data = [{"start": 3200, "end": 5800}, "請說普通話"]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "data.json")
+            dump_json(data, path)
+            with open(path, encoding="utf-8") as f:
+                self.assertIn("請說普通話", f.read())
+            self.assertEqual(load_json(path), data)
+
 class TestVoiceSegments(unittest.TestCase):
     """測試人聲片段提取（模擬）"""
 
-    @patch('subprocess.run')
-    def test_extract_voice_segments_mock(self, mock_run):
+    @patch('subprocess.Popen')
+    def test_extract_voice_segments_mock(self, mock_popen):
         """模擬 FFmpeg 輸出測試"""
         from WhisperX_ffmpeg_2_Subtitle import extract_voice_segments
 
-        # 模擬 FFmpeg 輸出
-        mock_result = MagicMock()
-        mock_result.stderr = """
-[silencedetect @ 0x55d6b8a3bcc0] silence_start: 1.5
-[silencedetect @ 0x55d6b8a3bcc0] silence_end: 3.2 | silence_duration: 1.7
-[silencedetect @ 0x55d6b8a3bcc0] silence_start: 5.8
-        """
-        mock_run.return_value = mock_result
+        # 模擬 FFmpeg 逐行輸出的 stderr 原始字節（含持續時間）
+        mock_proc = MagicMock()
+        mock_proc.stderr = iter([
+            b"  Duration: 00:01:00.00, start: 0.000000, bitrate: 128 kb/s\n",
+            b"[silencedetect @ 0x55d6b8a3bcc0] silence_start: 1.5\n",
+            b"[silencedetect @ 0x55d6b8a3bcc0] silence_end: 3.2 | silence_duration: 1.7\n",
+            b"[silencedetect @ 0x55d6b8a3bcc0] silence_start: 5.8\n",
+            b"[silencedetect @ 0x55d6b8a3bcc0] silence_end: 8.0 | silence_duration: 2.2\n",
+        ])
+        mock_proc.returncode = 0
+        mock_popen.return_value = mock_proc
 
-        # 模擬持續時間查詢
-        mock_duration = MagicMock()
-        mock_duration.stderr = "Duration: 00:01:00.00, start: 0.000000, bitrate: 128 kb/s"
+        # 執行測試
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                tempfile.NamedTemporaryFile(suffix='.wav') as tmp_audio:
+            output_json = os.path.join(tmpdir, "test.json")
+            result = extract_voice_segments(tmp_audio.name, output_json, vad_method="ffmpeg")
+            self.assertIsInstance(result, list)
+            self.assertEqual(result, [
+                {"start": 3200, "end": 5800},
+                {"start": 8000, "end": 60000},
+            ])
+            # 持續時間從同一次 FFmpeg 輸出解析，只啓動一個子進程
+            mock_popen.assert_called_once()
+            mock_proc.wait.assert_called_once()
+            # 只解碼第一條音軌
+            cmd = mock_popen.call_args[0][0]
+            self.assertEqual(cmd[cmd.index("-map") + 1], "0:a:0")
 
-        def side_effect(*args, **kwargs):
-            if "Duration:" in str(kwargs.get('stderr', '')) or \
-               (args and "Duration:" in str(args)):
-                return mock_duration
-            return mock_result
+    @patch('subprocess.run')
+    @patch('subprocess.Popen')
+    def test_extract_voice_segments_probe_fallback(self, mock_popen, mock_run):
+        """FFmpeg 未輸出時長時使用 ffprobe 補充"""
+        from WhisperX_ffmpeg_2_Subtitle import extract_voice_segments
 
-        mock_run.side_effect = side_effect
+        mock_proc = MagicMock()
+        mock_proc.stderr = iter([
+            b"  Duration: N/A, start: 0.000000, bitrate: N/A\n",
+            b"[silencedetect @ 0x55d6b8a3bcc0] silence_end: 2.0 | silence_duration: 2.0\n",
+        ])
+        mock_proc.returncode = 0
+        mock_popen.return_value = mock_proc
+        mock_run.return_value = MagicMock(stdout="10.500000\n")
 
-        # 執行測試
-        with tempfile.NamedTemporaryFile(suffix='.wav') as tmp_audio:
-            result = extract_voice_segments(tmp_audio.name, "test.json")
-            self.assertIsInstance(result, list)
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                tempfile.NamedTemporaryFile(suffix='.wav') as tmp_audio:
+            output_json = os.path.join(tmpdir, "test.json")
+            result = extract_voice_segments(tmp_audio.name, output_json, vad_method="ffmpeg")
+            self.assertEqual(result, [{"start": 2000, "end": 10500}])
+            self.assertEqual(mock_run.call_args[0][0][0], "ffprobe")
+
+    @patch('subprocess.Popen')
+    def test_extract_voice_segments_ffmpeg_error(self, mock_popen):
+        """FFmpeg 返回非零退出碼時報錯，而不是返回空的人聲片段"""
+        from WhisperX_ffmpeg_2_Subtitle import extract_voice_segments
+
+        mock_proc = MagicMock()
+        mock_proc.stderr = iter([b"broken.mp3: Invalid data found when processing input\n"])
+        mock_proc.returncode = 1
+        mock_popen.return_value = mock_proc
+
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                tempfile.NamedTemporaryFile(suffix='.mp3') as tmp_audio:
+            output_json = os.path.join(tmpdir, "test.json")
+            with self.assertRaisesRegex(RuntimeError, "Invalid data found"):
+                extract_voice_segments(tmp_audio.name, output_json, vad_method="ffmpeg")
+            self.assertFalse(os.path.exists(output_json))
+
+class TestAudioCache(unittest.TestCase):
+    """測試解碼音頻緩存（模擬）"""
+
+    @patch('subprocess.run')
+    def test_load_audio_cached(self, mock_run):
+        """同一文件只解碼一次，處理新文件時清理舊緩存"""
+        from WhisperX_ffmpeg_2_Subtitle import load_audio_cached
+
+        samples = np.linspace(-1, 1, 1600, dtype=np.float32)
+
+        def fake_ffmpeg(cmd, **kwargs):
+            # 模擬 FFmpeg 將解碼結果寫入命令最後的輸出路徑
+            samples.tofile(cmd[-1])
+            return MagicMock(returncode=0)
+        mock_run.side_effect = fake_ffmpeg
+
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                patch('WhisperX_ffmpeg_2_Subtitle.AUDIO_CACHE_DIR', tmpdir):
+            first_src = os.path.join(tmpdir, "a.mp3")
+            second_src = os.path.join(tmpdir, "b.mp3")
+            for src in (first_src, second_src):
+                open(src, "wb").close()
+
+            audio = load_audio_cached(first_src)
+            np.testing.assert_array_equal(audio, samples)
+            load_audio_cached(first_src)
+            self.assertEqual(mock_run.call_count, 1)
+
+            load_audio_cached(second_src)
+            self.assertEqual(mock_run.call_count, 2)
+            cached = [f for f in os.listdir(tmpdir) if f.endswith(".f32.raw")]
+            self.assertEqual(len(cached), 1)
+            del audio
+
+class TestAlignChunk(unittest.TestCase):
+    """測試逐字對齊結果整理（模擬）"""
+
+    @patch('WhisperX_ffmpeg_2_Subtitle.whisperx')
+    def test_align_chunk_columns(self, mock_whisperx):
+        """返回列式結果：時間加上片段起始時間，空白字符和無時間戳的字符被過濾"""
+        from WhisperX_ffmpeg_2_Subtitle import align_chunk
+
+        # whisperx.align 的真實輸出：逐字結果在 "chars" 下，無法對齊的字符沒有 start/end
+        mock_whisperx.align.return_value = {"segments": [
+            {"chars": [
+                {"char": "你", "start": 0.1, "end": 0.3, "score": 0.9},
+                {"char": " "},
+                {"char": "", "start": 0.4, "end": 0.4, "score": 0.0},
+                {"char": "好", "start": 0.4, "end": 0.6, "score": 0.8},
+                {"char": "，"},
+            ]},
+            {"text": ""},
+        ]}
+        starts, ends, texts = align_chunk({"start": 2000, "end": 3000}, None, "你 好，", None, {}, "cpu")
+        np.testing.assert_allclose(starts, [2.1, 2.4])
+        np.testing.assert_allclose(ends, [2.3, 2.6])
+        self.assertEqual(texts, ["你", "好"])
+
+    @patch('WhisperX_ffmpeg_2_Subtitle.whisperx')
+    def test_align_chunk_bad_chars_skipped(self, mock_whisperx):
+        """個別字符數據異常時只跳過該字符，窗口內其他字符照常輸出"""
+        from WhisperX_ffmpeg_2_Subtitle import align_chunk
+
+        mock_whisperx.align.return_value = {"segments": [{"chars": [
+            {"char": "你", "start": 0.1, "end": 0.3},
+            {"char": "好", "start": None, "end": 0.5},
+            {"char": "嗎", "start": float("nan"), "end": 0.7},
+            {"start": 0.7, "end": 0.8},
+            {"char": "呀", "start": 0.8, "end": 0.9},
+        ]}]}
+        starts, ends, texts = align_chunk({"start": 1000, "end": 31000}, None, "你好嗎呀", None, {}, "cpu")
+        np.testing.assert_allclose(starts, [1.1, 1.8])
+        np.testing.assert_allclose(ends, [1.3, 1.9])
+        self.assertEqual(texts, ["你", "呀"])
+
+    @patch('WhisperX_ffmpeg_2_Subtitle.load_align_model_cached', return_value=(None, {}))
+    @patch('WhisperX_ffmpeg_2_Subtitle.load_whisper_model_cached')
+    @patch('WhisperX_ffmpeg_2_Subtitle.align_chunk')
+    def test_failed_segment_skipped(self, mock_align, mock_load_model, _):
+        """對齊出錯的片段被跳過，程序錯誤則照常拋出"""
+        from WhisperX_ffmpeg_2_Subtitle import transcribe_with_whisperx
+
+        def fake_pipeline(inputs, batch_size, num_workers):
+            # 必須在本進程內處理，不派生 DataLoader 子進程
+            self.assertEqual(num_workers, 0)
+            return ({"text": "你"} for _ in inputs)
+        mock_load_model.return_value = fake_pipeline
+        # 兩段相距超過 30 秒，不會被合併爲同一個識別窗口
+        segments = [{"start": 0, "end": 1000}, {"start": 40000, "end": 41000}]
+        audio = np.zeros(16000 * 45, dtype=np.float32)
+
+        mock_align.side_effect = [RuntimeError("CUDA out of memory"),
+                                  (np.array([40.1]), np.array([40.2]), ["你"])]
+        with self.assertLogs('WhisperX_ffmpeg_2_Subtitle', level='DEBUG'):
+            result = transcribe_with_whisperx("x.wav", segments, "x", audio=audio)
+        self.assertEqual(result["text"], ["你"])
+        np.testing.assert_allclose(result["start_sec"], [40.1])
+
+        mock_align.side_effect = TypeError("bug")
+        with self.assertRaises(TypeError):
+            transcribe_with_whisperx("x.wav", segments, "x", audio=audio)
+
+    @patch('WhisperX_ffmpeg_2_Subtitle.load_align_model_cached', return_value=(None, {}))
+    @patch('WhisperX_ffmpeg_2_Subtitle.load_whisper_model_cached')
+    @patch('WhisperX_ffmpeg_2_Subtitle.align_chunk')
+    def test_error_cancels_pending_alignments(self, mock_align, mock_load_model, _):
+        """出錯時取消排隊中的對齊任務，不等所有片段處理完才拋出"""
+        import time
+        from WhisperX_ffmpeg_2_Subtitle import transcribe_with_whisperx, ALIGN_WORKERS
+
+        def fake_pipeline(inputs, batch_size, num_workers):
+            # 必須在本進程內處理，不派生 DataLoader 子進程
+            self.assertEqual(num_workers, 0)
+            return ({"text": "你"} for _ in inputs)
+        mock_load_model.return_value = fake_pipeline
+        # 40 段相距超過 30 秒，各自成爲一個識別窗口
+        segments = [{"start": i * 40000, "end": i * 40000 + 1000} for i in range(40)]
+        audio = np.zeros(16000 * 40 * 40, dtype=np.float32)
+
+        def fake_align(chunk, *args):
+            if chunk["start"] == 0:
+                raise TypeError("bug")
+            time.sleep(0.05)
+            return np.zeros(0), np.zeros(0), []
+        mock_align.side_effect = fake_align
+
+        with self.assertRaises(TypeError):
+            transcribe_with_whisperx("x.wav", segments, "x", audio=audio)
+        # 只有出錯時已在運行的任務會完成，其餘排隊任務被取消
+        self.assertLessEqual(mock_align.call_count, ALIGN_WORKERS + 1)
+
+    def test_segment_chunk(self):
+        """不對齊時整個片段輸出一條字幕，空文本不輸出"""
+        from WhisperX_ffmpeg_2_Subtitle import segment_chunk
+
+        starts, ends, texts = segment_chunk({"start": 2000, "end": 5500}, " 你好嗎 ")
+        np.testing.assert_allclose(starts, [2.0])
+        np.testing.assert_allclose(ends, [5.5])
+        self.assertEqual(texts, ["你好嗎"])
+        self.assertEqual(segment_chunk({"start": 0, "end": 1000}, " ")[2], [])
+
+    def test_segment_txt_keeps_word_spacing(self):
+        """整句字幕在 TXT 中按 separator 拼接，英文句間保留空格"""
+        from WhisperX_ffmpeg_2_Subtitle import segment_chunk, iter_subtitle_formats
+
+        records = [segment_chunk({"start": 0, "end": 1000}, " Hello there."),
+                   segment_chunk({"start": 1200, "end": 2000}, " How are you?")]
+        subtitles = {
+            "start_sec": np.concatenate([r[0] for r in records]),
+            "end_sec": np.concatenate([r[1] for r in records]),
+            "text": [t for r in records for t in r[2]],
+            "separator": " ",
+        }
+        outputs = iter_subtitle_formats(subtitles, "demo", "en-US")
+        self.assertEqual("".join(outputs["demo.en-US.txt"]), "Hello there. How are you?")
+        self.assertIn("\nHello there.\n", "".join(outputs["demo.en-US.srt"]))
+
+class TestModelCache(unittest.TestCase):
+    """測試模型緩存（模擬）"""
+
+    @patch.dict('WhisperX_ffmpeg_2_Subtitle._MODEL_CACHE', clear=True)
+    @patch.dict(sys.modules, {"whisperx.vads": MagicMock()})
+    def test_vad_model_reused(self):
+        """同一 VAD 方法在會話內只構建一次"""
+        from WhisperX_ffmpeg_2_Subtitle import load_vad_model_cached
+
+        vads = sys.modules["whisperx.vads"]
+        first = load_vad_model_cached("silero", "cpu")
+        self.assertIs(load_vad_model_cached("silero", "cpu"), first)
+        self.assertEqual(vads.Silero.call_count, 1)
+        with self.assertRaises(ValueError):
+            load_vad_model_cached("webrtc", "cpu")
+
+    @patch.dict('WhisperX_ffmpeg_2_Subtitle._MODEL_CACHE', clear=True)
+    @patch.dict(sys.modules, {"whisperx.vads": MagicMock()})
+    @patch('WhisperX_ffmpeg_2_Subtitle.whisperx')
+    def test_whisper_model_reused(self, mock_whisperx):
+        """相同設定重用模型，只更新初始提示詞"""
+        from dataclasses import dataclass
+        from WhisperX_ffmpeg_2_Subtitle import load_whisper_model_cached, _MODEL_CACHE
+
+        @dataclass
+        class Options:
+            initial_prompt: str = None
+
+        mock_whisperx.load_model.side_effect = lambda *a, **k: MagicMock(options=Options())
+
+        first = load_whisper_model_cached("base", "cpu", "int8", "zh", "提示一")
+        second = load_whisper_model_cached("base", "cpu", "int8", "zh", "提示二")
+        self.assertIs(first, second)
+        self.assertEqual(second.options.initial_prompt, "提示二")
+        self.assertEqual(mock_whisperx.load_model.call_count, 1)
+        # Whisper 管線使用緩存的 pyannote VAD，不再自行構建
+        self.assertIs(mock_whisperx.load_model.call_args.kwargs["vad_model"],
+                      _MODEL_CACHE[("vad", "pyannote", "cpu")])
+
+        # 切換模型大小時重新加載，並只保留一個 Whisper 模型
+        third = load_whisper_model_cached("small", "cpu", "int8", "zh")
+        self.assertIsNot(third, first)
+        self.assertIsNone(third.options.initial_prompt)
+        self.assertEqual(mock_whisperx.load_model.call_count, 2)
+        self.assertEqual(len([k for k in _MODEL_CACHE if k[0] == "asr"]), 1)
+
+    @patch('WhisperX_ffmpeg_2_Subtitle.torch')
+    def test_select_compute_settings(self, mock_torch):
+        """按 GPU 計算能力選擇量化類型與批量大小"""
+        from WhisperX_ffmpeg_2_Subtitle import select_compute_settings
+
+        self.assertEqual(select_compute_settings("cpu"), ("int8", 4))
+        mock_torch.cuda.get_device_capability.return_value = (7, 5)  # T4
+        self.assertEqual(select_compute_settings("cuda"), ("int8_float16", 16))
+        mock_torch.cuda.get_device_capability.return_value = (8, 0)  # A100
+        self.assertEqual(select_compute_settings("cuda"), ("int8_bfloat16", 32))
+        mock_torch.cuda.get_device_capability.return_value = (6, 0)  # P100
+        self.assertEqual(select_compute_settings("cuda"), ("float32", 8))
+
+    @patch.dict('WhisperX_ffmpeg_2_Subtitle._MODEL_CACHE', clear=True)
+    @patch('WhisperX_ffmpeg_2_Subtitle.whisperx')
+    def test_align_model_reused(self, mock_whisperx):
+        """同一語言重用對齊模型，切換語言時只保留最新的一個"""
+        from WhisperX_ffmpeg_2_Subtitle import load_align_model_cached, _MODEL_CACHE
+
+        mock_whisperx.load_align_model.side_effect = lambda **k: (MagicMock(), {"language": k["language_code"]})
+
+        first = load_align_model_cached("zh", "cpu")
+        self.assertIs(load_align_model_cached("zh", "cpu"), first)
+        self.assertEqual(mock_whisperx.load_align_model.call_count, 1)
+
+        load_align_model_cached("en", "cpu")
+        self.assertEqual(mock_whisperx.load_align_model.call_count, 2)
+        self.assertEqual([k for k in _MODEL_CACHE if k[0] == "align"], [("align", "en", "cpu")])
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file